@@ -12,6 +12,7 @@ import shutil
 import subprocess
 import concurrent.futures
 import json
+import hashlib
 from pathlib import Path
 import time
 
@@ -25,6 +26,16 @@ except ImportError:
 # Default to local config if present
 CONFIG_FILE = "batch_config.json"
 GENERATED_DIR = Path("../generated files").resolve()
+COMPONENT_CACHE_DIR = Path("Temp_Components").resolve()
+
+# Parameters that only affect the magnet layout, not the base shell.
+# Everything else (including magnet_thick_mm, which can raise the base height)
+# is part of the shell cache key.
+LAYOUT_ONLY_PARAMS = ('magnet_count', 'ribs_per_pocket', 'rib_thickness_mm',
+                      'magnet_dim_a_mm', 'glue_channels_enabled')
+
+# Parameters that define a single magnet pocket cutter.
+POCKET_PARAMS = ('magnet_dim_a_mm', 'magnet_thick_mm', 'glue_channels_enabled', '$fn')
 
 def load_config():
     """Load configuration from JSON file."""
@@ -121,6 +132,68 @@ def render_stl(args):
         print(f"Error rendering {name}: {e.stderr.decode()}")
         return None
 
+def component_path(stage, params):
+    """Cache file for a component, named by a hash of the params that shape it."""
+    digest = hashlib.sha1(json.dumps(params, sort_keys=True).encode()).hexdigest()[:12]
+    return COMPONENT_CACHE_DIR / f"{stage.lower()}_{digest}.stl"
+
+def plan_components(tasks):
+    """
+    Two-stage render: split magnet bases into cached sub-assemblies.
+    Stage one renders each unique shell (per size/shape) and pocket cutter
+    (per magnet size) once; stage two assembles every base from those meshes.
+    Returns (component_tasks, assembly_tasks).
+    """
+    component_tasks = {}
+    assembly_tasks = []
+
+    for output_path, params, name, openscad_bin, input_scad in tasks:
+        if not params.get('enable_magnet_pockets'):
+            assembly_tasks.append((output_path, params, name, openscad_bin, input_scad))
+            continue
+
+        shell_key = {k: v for k, v in params.items() if k not in LAYOUT_ONLY_PARAMS}
+        pocket_key = {k: params[k] for k in POCKET_PARAMS if k in params}
+        paths = {
+            'Body': component_path('Body', shell_key),
+            'Shell': component_path('Shell', shell_key),
+            'Pocket': component_path('Pocket', pocket_key),
+        }
+
+        # Components are rendered with this item's full params so the
+        # SCAD assertions see a valid configuration.
+        for stage, path in paths.items():
+            if path not in component_tasks and not path.exists():
+                stage_params = dict(params, render_stage=stage)
+                component_tasks[path] = (path, stage_params, f"{stage} {path.stem}", openscad_bin, input_scad)
+
+        assembly_params = dict(params, render_stage='Assembly',
+                               cached_body_file=paths['Body'].as_posix(),
+                               cached_shell_file=paths['Shell'].as_posix(),
+                               cached_pocket_file=paths['Pocket'].as_posix())
+        assembly_tasks.append((output_path, assembly_params, name, openscad_bin, input_scad))
+
+    return list(component_tasks.values()), assembly_tasks
+
+def run_render_tasks(tasks, cpu_cores, label="Rendered"):
+    """Render tasks in parallel. Returns list of generated paths."""
+    generated = []
+    with concurrent.futures.ThreadPoolExecutor(max_workers=cpu_cores) as executor:
+        futures = {executor.submit(render_stl, task): task[2] for task in tasks}
+        
+        for future in concurrent.futures.as_completed(futures):
+            name = futures[future]
+            try:
+                result = future.result()
+                if result:
+                    print(f"  + {label}: {name}")
+                    generated.append(result)
+                else: 
+                    pass
+            except Exception as exc:
+                print(f"  ! Exception for {name}: {exc}")
+    return generated
+
 def process_batch(batch_name, category_path, items_config, base_dir, config):
     """Process a full batch of items."""
     target_dir = GENERATED_DIR / category_path
@@ -151,26 +224,29 @@ def process_batch(batch_name, category_path, items_config, base_dir, config):
         
         tasks.append((stl_path, params, item['Name'], config['openscad_path'], "base_generator.scad"))
 
-    # Parallel Execution
-    generated_stls = []
     cpu_cores = config.get('cpu_cores', 0)
     if cpu_cores <= 0:
         cpu_cores = os.cpu_count() or 4
-        
-    with concurrent.futures.ThreadPoolExecutor(max_workers=cpu_cores) as executor:
-        futures = {executor.submit(render_stl, task): task[2] for task in tasks}
-        
-        for future in concurrent.futures.as_completed(futures):
-            name = futures[future]
-            try:
-                result = future.result()
-                if result:
-                    print(f"  + Rendered: {name}")
-                    generated_stls.append(result)
-                else: 
-                    pass
-            except Exception as exc:
-                print(f"  ! Exception for {name}: {exc}")
+
+    # Stage one: cache shared sub-assemblies
+    if config.get('two_stage_render', False):
+        ensure_dir(COMPONENT_CACHE_DIR)
+        full_tasks = {task[0]: task for task in tasks}
+        component_tasks, tasks = plan_components(tasks)
+        if component_tasks:
+            print(f"  Caching {len(component_tasks)} components...")
+            run_render_tasks(component_tasks, cpu_cores, label="Cached")
+
+        # Fall back to a full render if any of an item's components failed
+        for i, task in enumerate(tasks):
+            params = task[1]
+            if params.get('render_stage') == 'Assembly':
+                cached = (params['cached_body_file'], params['cached_shell_file'], params['cached_pocket_file'])
+                if not all(os.path.exists(path) for path in cached):
+                    tasks[i] = full_tasks[task[0]]
+
+    # Parallel Execution (stage two when two-stage rendering is enabled)
+    generated_stls = run_render_tasks(tasks, cpu_cores)
 
     # Re-verify all expected files exist (including skipped ones)
     valid_stls = sorted([str(temp_dir / f"{item['Name']}.stl") 
@@ -233,6 +309,10 @@ def main():
     base_dir = Path.cwd()
     ensure_dir(GENERATED_DIR)
     
+    # Drop components cached by an interrupted run (SCAD may have changed since)
+    if COMPONENT_CACHE_DIR.exists():
+        shutil.rmtree(COMPONENT_CACHE_DIR)
+    
     magnet_matrices = config['magnet_matrices']
     base_sizes = config['base_sizes']
     oval_sizes = config['oval_sizes']
@@ -358,6 +438,10 @@ def main():
             if items_config:
                 process_batch(batch_name, full_category_path, items_config, base_dir, config)
 
+    if COMPONENT_CACHE_DIR.exists():
+        print("\nCleaning up cached components...")
+        shutil.rmtree(COMPONENT_CACHE_DIR)
+
     print("\nCOMPLETE! All batches generated in 'generated files/'")
 
 if __name__ == "__main__":